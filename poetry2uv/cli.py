@@ -1,3 +1,4 @@
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -5,12 +6,11 @@ from pathlib import Path
 
 def main():
     script_path = str(Path(__file__).parent.parent / 'bin' / 'convert_poetry_to_uv.sh')
-    result = subprocess.run([script_path] + sys.argv[1:], capture_output=True, text=True)
-    print(result.stdout)
-    print(result.stderr, file=sys.stderr)
-    if result.returncode != 0:
-        raise SystemExit(result.returncode)
-    sys.exit(result.returncode)
+    if os.name == 'nt':
+        # no exec semantics on Windows, so wait on the script instead of replacing this process
+        result = subprocess.run([script_path] + sys.argv[1:])
+        sys.exit(result.returncode)
+    os.execv(script_path, [script_path] + sys.argv[1:])
 
 
 if __name__ == '__main__':
@@ -1,16 +1,101 @@
+import functools
 import os
 import re
-from copy import deepcopy
+import sys
+from pathlib import Path
 from typing import Any, Collection, Optional
 
+import tomli_w
 import tomlkit
-from tomlkit import TOMLDocument
-from tomlkit.api import Array
-from tomlkit.exceptions import NonExistentKey
-from tomlkit.toml_file import TOMLFile
+from tomlkit.api import Array, InlineTable
+from tomlkit.items import Trivia
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
 
 PathLike = os.PathLike | str
 
+_VERSION_RE = re.compile(r"^([=^~]{0,2})([\d.*]+(?:-\w+(?:\.\d)?)?)")  # versions involving =, ^, ~ need to be converted
+_AUTHOR_RE = re.compile(r"^(.*?)\s+<([^>]+)>$")
+# separates out an optional pre-release or build metadata after a dash or plus
+_SPLIT_VERSION_RE = re.compile(r"^(\d+)(?:\.(\d+))?(?:\.(\d+))?([\-\+].+)?$")
+_CONSTANT_CONSTRAINTS = {"*": "", "": ""}  # constraints that don't need the regex at all
+
+
+def _multiline_array(items: list) -> Array:
+    """Wraps a plain list in a multiline tomlkit array in one go, rather than appending item by item."""
+    # construct the Array directly, tomlkit.array() runs its parser on "[]" every call
+    array = Array([], Trivia(), multiline=True)
+    array.extend(items)
+    return array
+
+
+def _inline_table(mapping: dict) -> InlineTable:
+    """Wraps a plain mapping in a tomlkit inline table."""
+    table = tomlkit.inline_table()
+    table.update(mapping)
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_author(author_full: str) -> tuple[str, Optional[str]]:
+    """Splits a poetry author string like "Name <email>" into its name and email, if present."""
+    # plain string operations cover the common format, the regex handles anything unusual
+    if author_full.endswith(">"):
+        name, sep, email = author_full[:-1].rpartition(" <")
+        if sep and email and ">" not in email and "<" not in name:
+            return name.rstrip(), email
+    if (match := _AUTHOR_RE.match(author_full)) is not None:
+        return match.group(1), match.group(2)
+    return author_full, None
+
+
+def _increment_version(version_split: list[str], increment_index: int) -> None:
+    """Increments the version number at the specified index in place."""
+    component = version_split[increment_index]
+    if increment_index == 2 and (dash := component.rfind("-")) != -1:
+        # if the patch version has a pre-release, increment the pre-release number
+        version_split[increment_index] = f"{component[: dash + 1]}{int(component[dash + 1 :]) + 1}"
+    else:
+        version_split[increment_index] = str(int(component) + 1)
+    version_split[increment_index + 1 :] = ["0"] * (len(version_split) - increment_index - 1)
+
+
+def _first_nonzero_index(split_numbers: list[str]) -> int:
+    for i, value in enumerate(split_numbers):
+        if int(value) != 0:
+            return i
+    return -1
+
+
+def _caret_upper_bound(split_numbers: list[str]) -> str:
+    """Upper bound for a caret constraint, e.g. ^1.2.3 -> <2 and ^0.1.2 -> <0.2."""
+    i_nonzero = _first_nonzero_index(split_numbers)
+    _increment_version(split_numbers, i_nonzero)
+    return f",<{'.'.join(split_numbers[: i_nonzero + 1])}"
+
+
+def _tilde_upper_bound(split_numbers: list[str]) -> str:
+    """Upper bound for a tilde constraint, e.g. ~1.2.3 -> <1.3.0 and ~1 -> <2."""
+    if len(split_numbers) >= 3 and _first_nonzero_index(split_numbers) < 2:
+        _increment_version(split_numbers, 1)
+        split_numbers[2] = "0"
+    else:
+        _increment_version(split_numbers, len(split_numbers) - 1)
+    return f",<{'.'.join(split_numbers)}"
+
+
+# maps poetry symbols to their PEP 440 replacement and upper bound function, other symbols are kept as is
+# no symbolic expression assumes equality (includes e.g. 1.2.*)
+_SYMBOL_MAP = {
+    "": ("==", None),
+    "=": ("==", None),
+    "^": (">=", _caret_upper_bound),
+    "~": (">=", _tilde_upper_bound),
+}
+
 
 class PyProject:
     """This class converts a Poetry-style pyproject.toml to PEP 508 format.
@@ -18,10 +103,6 @@ class PyProject:
     it does not return the intermediate representation.
     """
 
-    version_pattern = re.compile(
-        r"^([=^~]{0,2})([\d.*]+(?:-\w+(?:\.\d)?)?)"
-    )  # versions involving =, ^, ~ need to be converted
-    author_pattern = re.compile(r"^(.*?)\s+<([^>]+)>$")
     git_source_keys = {"git", "rev", "tag", "branch"}
 
     def __init__(
@@ -38,19 +119,19 @@ class PyProject:
         :param exported_reqs: if provided, will use the requirements.txt file to get exact versions for dependencies.
         """
         self.project_dir = project_dir
+        self._base = Path(project_dir)
+        self._abs_project_dir = os.path.abspath(project_dir)
         self.prompt_for_version = prompt_for_version
-        self.sources = {}
         self.remove_entries = remove_entries if remove_entries is not None else []
+        self._remove_keys = [tuple(entry.split(".")) for entry in self.remove_entries]
         self.convert_to_pep508(input_file, output_file, exported_reqs, keep_poetry)
 
-    def convert_version_entry(self, version_entry: str | Array) -> str:
+    def convert_version_entry(self, version_entry: str | list) -> str:
         """Converts poetry version constraint specifications to PEP 621."""
-        # might want to handle multiple comma-separated constraints e.g. str(version_constraint).split(',')
-
         if version_entry == "*":
             return ""
 
-        if isinstance(version_entry, Array):
+        if isinstance(version_entry, list):
             if len(version_entry) > 1 and self.prompt_for_version:
                 print("Multiple constraints for source not supported, please select one:")
                 version_entry = self.select_input_choice(version_entry)
@@ -61,50 +142,37 @@ class PyProject:
             self.handle_git_entry(version_entry)
             return ""
 
-        groups = version_entry.split(",")
-
-        return ",".join(self.convert_version_constraint(group) for group in groups)
+        return self.convert_version_string(version_entry)
 
     @staticmethod
-    def increment_version(version_split: list[str], increment_index: int) -> None:
-        """Increments the version number at the specified index in place."""
-        if increment_index == 2 and "-" in version_split[increment_index]:
-            # if the patch version has a pre-release, increment the pre-release number
-            pre_release_split = version_split[increment_index].split("-")
-            pre_release_split[-1] = str(int(pre_release_split[-1]) + 1)
-            version_split[increment_index] = "-".join(pre_release_split)
-        else:
-            version_split[increment_index] = str(int(version_split[increment_index]) + 1)
-        for i in range(increment_index + 1, len(version_split)):
-            version_split[i] = "0"
+    @functools.lru_cache(maxsize=4096)
+    def convert_version_string(version_entry: str) -> str:
+        """Converts a comma-separated poetry version specification to PEP 440, e.g. "^1.2,!=1.2.5".
+        Cached like convert_version_constraint, so repeated specifications skip the split and join."""
+        converted_groups = (PyProject.convert_version_constraint(group) for group in version_entry.split(","))
+
+        # wildcard groups convert to no constraint, so leave them out rather than joining empty strings
+        return ",".join(group for group in converted_groups if group)
+
+    increment_version = staticmethod(_increment_version)
 
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def convert_version_constraint(version_constraint: str) -> str:
+        """Converts a single poetry version constraint to PEP 440.
+        Results are cached, as the same constraints tend to repeat across dependency groups."""
+        if (constant := _CONSTANT_CONSTRAINTS.get(version_constraint)) is not None:
+            return constant
+
+        # comparison operators are already valid PEP 440, so skip the regex
+        if version_constraint[:1] in ("<", ">", "!") or version_constraint.startswith("=="):
+            return str(version_constraint)
+
         # check if version constraint is a string matching the typical pattern needing conversion
-        if (match := PyProject.version_pattern.match(version_constraint)) is not None:
-            symbols = match.group(1)
-            numbers = match.group(2)
-            split_numbers = numbers.split(".")
-            upper_constraint = ""
-            i_nonzero = next((i for i, value in enumerate(split_numbers) if int(value) != 0), -1)  # first nonzero index
-
-            if symbols in ["", "="]:  # base case for no symbolic expression, assume equality (includes e.g. 1.2.*)
-                symbols = "=="
-            elif symbols == "^":
-                symbols = ">="
-                PyProject.increment_version(split_numbers, i_nonzero)
-                # split_numbers[i_nonzero] = str(int(split_numbers[i_nonzero]) + 1)
-                upper_constraint = f",<{'.'.join(map(str, split_numbers[: i_nonzero + 1]))}"
-            elif symbols == "~":
-                symbols = ">="
-                if len(split_numbers) >= 3 and i_nonzero < 2:
-                    PyProject.increment_version(split_numbers, 1)
-                    # split_numbers[1] = str(int(split_numbers[1]) + 1)
-                    split_numbers[2] = "0"
-                else:
-                    PyProject.increment_version(split_numbers, len(split_numbers) - 1)
-                    # split_numbers[-1] = str(int(split_numbers[-1]) + 1)
-                upper_constraint = f",<{'.'.join(split_numbers)}"
+        if (match := _VERSION_RE.match(version_constraint)) is not None:
+            symbols, numbers = match.group(1), match.group(2)
+            symbols, upper_bound = _SYMBOL_MAP.get(symbols, (symbols, None))
+            upper_constraint = upper_bound(numbers.split(".")) if upper_bound is not None else ""
             return f"{symbols}{numbers}{upper_constraint}"
 
         elif version_constraint.startswith("~") or version_constraint.startswith("^"):
@@ -118,8 +186,7 @@ class PyProject:
         Parse a version string like "1.2.3" or "1.2.3-alpha" into major, minor, patch, and extra.
         Returns (major, minor, patch, extra).
         """
-        # This regex separates out an optional pre-release or build metadata after a dash or plus.
-        match = re.match(r"^(\d+)(?:\.(\d+))?(?:\.(\d+))?([\-\+].+)?$", version.strip())
+        match = _SPLIT_VERSION_RE.match(version.strip())
         if not match:
             # If we can't parse it at all, fallback to all zeros
             return 0, 0, 0, ""
@@ -141,15 +208,41 @@ class PyProject:
                 f"Can not handle duped sources with name {package_name}!"
                 f"\n{self.sources[package_name]} -> {git_entry['git']}"
             )
-        source = tomlkit.inline_table()
-        source.update({k: v for k, v in git_entry.items() if k in self.git_source_keys})
-        self.sources[package_name] = source
+        self.sources[package_name] = _inline_table({k: v for k, v in git_entry.items() if k in self.git_source_keys})
         return package_name
 
+    def handle_url_entry(self, name: str, url: str) -> str:
+        """Registers a url dependency as a uv source.
+        Returns the package name."""
+        self.sources[name] = _inline_table({"url": url})
+        return name
+
+    def handle_path_entry(self, member: str, develop: Optional[bool] = None) -> str:
+        """Registers a local path dependency as a uv source.
+        Returns the package name."""
+        # for some reason, `uv lock` doesn't work unless the source members are altered from .e.g 'config'
+        member_name = self.get_package_name_from_path_dependency(member)
+        self.sources[member_name] = _inline_table({"path": member})
+        if develop is not None:
+            print(f"warning, {member} was labeled as 'develop'={develop}, but workspace members are always editable")
+        return member_name
+
     def get_package_name_from_path_dependency(self, dependency_rel_path: str):
-        dependency_path = os.path.abspath(os.path.join(self.project_dir, dependency_rel_path, "pyproject.toml"))
-        if os.path.exists(dependency_path):
-            dependency_toml: TOMLDocument = TOMLFile(dependency_path).read()
+        return self._read_package_name(self._abs_project_dir, dependency_rel_path)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _read_package_name(abs_project_dir: str, dependency_rel_path: str) -> str:
+        """Gets the project name from a path dependency's pyproject.toml, falling back to the directory name.
+        Cached, as workspace members are often referenced from several dependency groups."""
+        dependency_path = os.path.join(abs_project_dir, dependency_rel_path, "pyproject.toml")
+        try:
+            with open(dependency_path, "rb") as f:
+                dependency_toml = tomllib.load(f)
+        except OSError:
+            # no pyproject.toml, e.g. the path is a directory without one or an sdist/wheel file
+            pass
+        else:
             project_name = dependency_toml.get("project", {}).get("name")
             if project_name:
                 return project_name
@@ -176,53 +269,36 @@ class PyProject:
         """
         returns list of normal deps and list of inherited projects
         """
-        deps = tomlkit.array()
-        deps.multiline(True)
-        members = tomlkit.array()
-        members.multiline(True)
+        deps = []
+        members = []
         for name, dep_v in deps_list.items():
             # skip this case, as it's handled separately
             if name == "python":
                 continue
 
             if isinstance(dep_v, dict):
-                dep_map = deepcopy(dep_v)
+                dep_map = dict(dep_v)
 
                 if "git" in dep_map:
-                    pkg_name = self.handle_git_entry(dep_map)
-                    deps.append(pkg_name)
+                    deps.append(self.handle_git_entry(dep_map))
                     continue
-                if "url" in dep_map:
-                    dep_url = dep_map.pop("url")
-                    source = tomlkit.inline_table()
-                    source.update({"url": dep_url})
-                    self.sources[name] = source
-                    deps.append(name)
+                if (dep_url := dep_map.pop("url", None)) is not None:
+                    deps.append(self.handle_url_entry(name, dep_url))
 
                 # get a local package from a repo path
-                if "path" in dep_map:
-                    member = dep_map.pop("path")
-                    # for some reason, `uv lock` doesn't work unless the source members are altered from .e.g 'config'
-                    member_name = self.get_package_name_from_path_dependency(member)
+                if (member := dep_map.pop("path", None)) is not None:
                     members.append(member)
-                    deps.append(member_name)
-                    source = tomlkit.inline_table()
-                    source.update({"path": member})
-                    self.sources[member_name] = source
-                    if "develop" in dep_map:
-                        print(
-                            f"warning, {members[-1]} was labeled as 'develop'={dep_map.pop('develop')}, "
-                            f"but workspace members are always editable"
-                        )
-                vers = ""  # version string
-                if "extras" in dep_map:
-                    vers = str(dep_map.pop("extras")).replace("'", "")
-                if "version" in dep_map:
-                    converted_version = self.convert_version_entry(dep_map.pop("version"))
-                    vers = f"{vers}{converted_version}"
+                    deps.append(self.handle_path_entry(member, dep_map.pop("develop", None)))
+
+                vers_parts = []  # extras and version string
+                if (extras := dep_map.pop("extras", None)) is not None:
+                    vers_parts.append(str(extras).replace("'", ""))
+                if (version := dep_map.pop("version", None)) is not None:
+                    vers_parts.append(self.convert_version_entry(version))
+                vers = "".join(vers_parts)
                 optional = dep_map.pop("optional", False)
                 if vers and not optional:
-                    deps.append(f"{name}{vers}")
+                    deps.append(name + vers)
                 if dep_map:
                     raise NotImplementedError(
                         f"Remaining key{'s' if len(dep_map.keys()) > 1 else ''} in deps entry: {dep_map.keys()}"
@@ -232,28 +308,26 @@ class PyProject:
                 dep_v = self.convert_version_entry(dep_v)
                 deps.append(f"{name}{dep_v}")
 
-        return deps, members
+        return _multiline_array(deps), _multiline_array(members)
 
     def extract_from_requirements_txt(self, requirements_file: str) -> Array:
         """Extracts an array list of dependencies from a requirements.txt file."""
-        reqs = tomlkit.array()
-        reqs.multiline(True)
-        with open(f"{self.project_dir}/{requirements_file}") as f:
-            for line in f.readlines():
-                split_line = line.split()
-                if len(split_line) > 0 and (len(split_line) == 1 or split_line[1] == ";"):
+        reqs = []
+        with open(self._base / requirements_file) as f:
+            for line in f:
+                split_line = line.split(maxsplit=1)  # requirement and whatever follows the first whitespace
+                if not split_line or split_line[0].startswith("#"):
+                    continue
+                if len(split_line) == 1 or split_line[1].startswith(";"):
                     reqs.append(split_line[0])
-        return reqs
+        return _multiline_array(reqs)
 
-    def get_author_name_email(self, author_full: str) -> tomlkit.api.InlineTable:
+    def get_author_name_email(self, author_full: str) -> InlineTable:
         """Converts a full author string to a PEP 621 author table."""
-        author_table = tomlkit.inline_table()
-        if (match := self.author_pattern.match(author_full)) is not None:
-            name, email = match.groups()
-            author_table.update({"name": name, "email": email})
-        else:
-            author_table.update({"name": author_full})
-        return author_table
+        name, email = _parse_author(author_full)
+        if email is not None:
+            return _inline_table({"name": name, "email": email})
+        return _inline_table({"name": name})
 
     def convert_to_pep508(
         self, input_file: PathLike, output_file: PathLike, exported_reqs: str = "", keep_poetry: bool = False
@@ -265,14 +339,15 @@ class PyProject:
         :param keep_poetry: If True, keep the Poetry sections in the output file. This will allow cross-compatibility.
         """
 
-        with open(f"{self.project_dir}/{input_file}", "r") as f:
+        # the non-poetry tables are written back out, so parse with tomlkit to keep their formatting and comments
+        with open(self._base / input_file, "rb") as f:
             pyproject_data = tomlkit.parse(f.read())
 
         # Extract relevant data from the Poetry section
         tool_data = pyproject_data.get("tool", {})
         try:
             poetry_data = tool_data.pop("poetry") if not keep_poetry else tool_data.get("poetry", {})
-        except NonExistentKey:
+        except KeyError:
             print("tool keys:", tool_data.keys(), sep="\n")
             raise
         project_name = poetry_data.get("name")
@@ -289,25 +364,21 @@ class PyProject:
         dev_deps, dev_members = self.convert_deps_list(dev_dependencies)
         members.extend(dev_members)
 
-        # Construct the workspace table which specifies inherited projects
-        workspace_table = tomlkit.inline_table()
-        workspace_table.update({"members": members})
-        # currently not using the workspace block
-
         # get optional deps groups
         optional_deps = {}
-        groups = poetry_data.get("group", {})
-        for group_name, group in groups.items():
-            opt_deps, opt_members = self.convert_deps_list(group["dependencies"])
-            optional_deps[group_name] = opt_deps
+        for group_name, group in poetry_data.get("group", {}).items():
+            optional_deps[group_name], _ = self.convert_deps_list(group["dependencies"])
+        optional_deps["dev"] = dev_deps
+
+        # Construct the workspace table which specifies inherited projects
+        workspace_table = _inline_table({"members": members})
+        # currently not using the workspace block
 
         # convert authors to PEP 621 format
         author_tables = [self.get_author_name_email(author) for author in authors]
         authors = tomlkit.array()
         authors.extend(author_tables)
 
-        optional_deps["dev"] = dev_deps
-
         # Construct the PEP 508 project table
         pep508_data = {
             "project": {
@@ -328,7 +399,7 @@ class PyProject:
         }
 
         if "extras" in poetry_data:
-            pep508_data["project"]["optional-dependencies"] = deepcopy(poetry_data["extras"])
+            pep508_data["project"]["optional-dependencies"] = dict(poetry_data["extras"])
 
         if not keep_poetry:
             pyproject_data.pop("build-system", None)
@@ -337,29 +408,30 @@ class PyProject:
         pyproject_data.update(pep508_data)
 
         # Remove entries specified by the user
-        for entry in self.remove_entries:
+        for *parent_keys, last_key in self._remove_keys:
             dict_level = pyproject_data
-            keys = entry.split(".")
-            for key in keys[:-1]:
+            for key in parent_keys:
                 dict_level = dict_level[key]
-            if keys[-1] in dict_level:
-                dict_level.pop(keys[-1])
-
-        # create a new container to write the data to
-        container = tomlkit.api.Container()
-        container.update(pyproject_data)
-        pyproject_data = container
+            if last_key in dict_level:
+                dict_level.pop(last_key)
 
         # Write the PEP 508 data to the output file
-        with open(f"{self.project_dir}/{output_file}", "w") as f:
+        with open(self._base / output_file, "w") as f:
             tomlkit.dump(pyproject_data, f)
 
         # if specified, get exact versions from an exported requirements.txt file
         if exported_reqs:
-            pyproject_data["project"]["dependencies"] = self.extract_from_requirements_txt(exported_reqs)
-            optional_deps.clear()
-            with open(f"{self.project_dir}/pyproject_pinned.toml", "w") as f:
-                tomlkit.dump(pyproject_data, f)
+            # only the project table differs, the rest of the data is shared with the unpinned output
+            pinned_data = {
+                **pyproject_data,
+                "project": {
+                    **pyproject_data["project"],
+                    "dependencies": self.extract_from_requirements_txt(exported_reqs),
+                },
+            }
+            # the pinned file is only an intermediate input to `uv lock`, so its formatting doesn't matter
+            with open(self._base / "pyproject_pinned.toml", "wb") as f:
+                tomli_w.dump(pinned_data, f)
 
 
 if __name__ == "__main__":
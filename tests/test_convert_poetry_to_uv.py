@@ -31,6 +31,7 @@ def converter() -> PyProject:
         ("<=1.2.3", "<=1.2.3"),  # '<=' => no change
         (">1.2.3", ">1.2.3"),  # '>' => no change
         (">=1.2.3", ">=1.2.3"),  # '>=' => no change
+        ("==1.0rc1", "==1.0rc1"),  # Explicit '==' with a PEP 440 pre-release => no change
         # Edge cases
         ("", ""),  # Empty constraint => no constraint
         # tilde cases
@@ -51,6 +52,8 @@ def converter() -> PyProject:
         (">=1.0.0,<2.0.0,!=1.2.3", ">=1.0.0,<2.0.0,!=1.2.3"),  # Multiple constraints with '!='
         ("^1.0.0,!=1.0.1", ">=1.0.0,<2,!=1.0.1"),  # '^' with '!='
         ("~1.0.0,!=1.0.1", ">=1.0.0,<1.1.0,!=1.0.1"),  # '~' with '!='
+        ("*,>=1", ">=1"),  # wildcard group => dropped from the constraints
+        ("*,^1.2", ">=1.2,<2"),  # wildcard group with '^'
         # Wildcard cases
         ("1.*", "==1.*"),  # Major version wildcard
         ("1.2.*", "==1.2.*"),  # Minor version wildcard
@@ -77,6 +80,33 @@ def test_invalid_patterns(converter: PyProject, constraint: str):
         converter.convert_version_entry(constraint)
 
 
+@pytest.mark.parametrize(
+    "author, expected",
+    [
+        ("Arthur Author <testauthor@test.org>", {"name": "Arthur Author", "email": "testauthor@test.org"}),
+        ("Arthur Author", {"name": "Arthur Author"}),
+        ("Arthur  Author  <testauthor@test.org>", {"name": "Arthur  Author", "email": "testauthor@test.org"}),
+        ("Arthur Author\t<testauthor@test.org>", {"name": "Arthur Author", "email": "testauthor@test.org"}),
+        ("Arthur Author <>", {"name": "Arthur Author <>"}),
+        ("A <b <c@d>", {"name": "A", "email": "b <c@d"}),
+    ],
+)
+def test_author_name_email(converter: PyProject, author: str, expected: dict):
+    assert converter.get_author_name_email(author) == expected
+
+
+@pytest.mark.parametrize(
+    "dependency_path, expected",
+    [
+        ("../..", "poetry2uv"),  # name read from the dependency's pyproject.toml
+        ("test/", "test"),  # missing directory => directory name
+        ("requirements_in.txt", "requirements_in.txt"),  # file, e.g. an sdist or wheel => file name
+    ],
+)
+def test_package_name_from_path_dependency(converter: PyProject, dependency_path: str, expected: str):
+    assert converter.get_package_name_from_path_dependency(dependency_path) == expected
+
+
 def assert_files_equal(file1: str | Path, file2: str | Path):
     """
     Reads two files, compares their contents, and raises an AssertionError
@@ -102,3 +132,8 @@ def assert_files_equal(file1: str | Path, file2: str | Path):
 
 def test_convert_pyproject(converter: PyProject):
     assert_files_equal(str(resources_path / "pyproject_out.toml"), str(resources_path / "pyproject_expected.toml"))
+
+
+def test_extract_from_requirements_txt(converter: PyProject):
+    reqs = converter.extract_from_requirements_txt("requirements_in.txt")
+    assert list(reqs) == ["click==8.1.7", "numpy==1.23.4", "pyspark==3.5.0", "pyarrow==14.0.1"]